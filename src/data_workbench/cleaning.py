@@ -1,8 +1,21 @@
 import pandas as pd
-from enum import Enum
+from enum import IntEnum
 import numpy as np
 
 
+class DateFixType(IntEnum):
+    """Fixes which fix_order_ship_dates can make to a row. The value
+    is the position of the fix when picking the best, so on a tie the
+    lower value is taken.
+    """
+
+    NONE = 0
+    SWAP = 1
+    ORDER = 2
+    SHIP = 3
+    BOTH = 4
+
+
 class DataCleaner:
 
     def __init__(self):
@@ -34,161 +47,142 @@ class DataCleaner:
         # Calculate the time between order and shipping
         df["Time Till Shipping"] = df[self.ship] - df[self.order]
 
+        # Compare as int64 nanoseconds, NaT is the smallest int64 value
+        time_till_ns = (
+            df[self.time_col_name].to_numpy(dtype="timedelta64[ns]").view("int64")
+        )
+        threshold_ns = pd.Timedelta(days=self.day_threshold).value
+        nat_ns = np.iinfo(np.int64).min
+
         # Now we only want to deal with rows with issues
         # NEgative numbers and ones with days over the threshold
-        fix_mask = (
-            (df[self.time_col_name] < pd.Timedelta(0))
-            | (df[self.time_col_name] > pd.Timedelta(days=self.day_threshold))
-        ) & df[self.time_col_name].notna()
-
-        df.loc[fix_mask] = df.loc[fix_mask].apply(self._best_time_fix, axis=1)
-
-        return df
-
-    def _best_time_fix(self, row):
-        """Row logic used in fix_order_ship_dates
-
-        Args:
-            row: row which possibly has erroneous data for order and ship date
-
-        Returns:
-            returns the altered row with fixed order and ship date
-        """
-
-        row = row.copy()
-
-        class DateFixType(Enum):
-            NONE = 0
-            BOTH = 1
-            SHIP = 2
-            ORDER = 3
-            SWAP = 4
-
-        order_date = row[self.order]
-        ship_date = row[self.ship]
-
-        # Covert the dates to different formats
-        order_reformat_valid = True
-        try:
-            reformated_order_date = self._swap_day_month(order_date)
-        except ValueError:
-            order_reformat_valid = False
-
-        ship_reformat_valid = True
-        try:
-            reformated_ship_date = self._swap_day_month(ship_date)
-        except ValueError:
-            ship_reformat_valid = False
-
-        # Preset with negative values so they are not picked
-        both_reformat_time = ship_reformat_time = order_reformat_time = pd.Timedelta(
-            days=-1
+        fix_mask = ((time_till_ns < 0) | (time_till_ns > threshold_ns)) & (
+            time_till_ns != nat_ns
         )
 
-        # No changes
-        no_change_time = ship_date - order_date
-
-        # Swap the dates
-        swap_time = order_date - ship_date
+        if not fix_mask.any():
+            return df
 
-        # Order reformat
-        if order_reformat_valid:
-            order_reformat_time = ship_date - reformated_order_date
+        order_dates = df.loc[fix_mask, self.order].to_numpy(dtype="datetime64[ns]")
+        ship_dates = df.loc[fix_mask, self.ship].to_numpy(dtype="datetime64[ns]")
+
+        # Covert the dates to different formats, NaT where it isn't possible
+        reformated_order_dates = self._swap_day_month_vec(order_dates)
+        reformated_ship_dates = self._swap_day_month_vec(ship_dates)
+
+        # The order and ship dates each possible fix would give
+        fixed_orders = {
+            DateFixType.NONE: order_dates,
+            DateFixType.SWAP: ship_dates,
+            DateFixType.ORDER: reformated_order_dates,
+            DateFixType.SHIP: order_dates,
+            DateFixType.BOTH: reformated_order_dates,
+        }
+        fixed_ships = {
+            DateFixType.NONE: ship_dates,
+            DateFixType.SWAP: order_dates,
+            DateFixType.ORDER: ship_dates,
+            DateFixType.SHIP: reformated_ship_dates,
+            DateFixType.BOTH: reformated_ship_dates,
+        }
+
+        # Time till shipping for every possible fix for every row, each fix
+        # gets its own contiguous row which is written to in place
+        fix_times = np.empty((len(DateFixType), len(order_dates)), "timedelta64[ns]")
+        for fix in DateFixType:
+            np.subtract(fixed_ships[fix], fixed_orders[fix], out=fix_times[fix])
+
+        # Negative and invalid fixes are set very high so they are not picked
+        fix_times_ns = fix_times.view("int64")
+        fix_times_ns[np.isnat(fix_times) | (fix_times_ns < 0)] = np.iinfo(np.int64).max
 
-        # Ship reformat
-        if ship_reformat_valid:
-            ship_reformat_time = reformated_ship_date - order_date
+        # Now we pick the lowest which is not negative
+        best_fix = fix_times_ns.argmin(axis=0)
 
-        # Both reformat
-        if order_reformat_valid and ship_reformat_valid:
-            both_reformat_time = reformated_ship_date - reformated_order_date
+        new_order_dates = np.choose(
+            best_fix, [fixed_orders[fix] for fix in DateFixType]
+        )
+        new_ship_dates = np.choose(best_fix, [fixed_ships[fix] for fix in DateFixType])
 
-        # Set this to a very high value so it overwritten
-        best_pick = pd.Timedelta(days=99999)
+        # Only the fixed rows have changed so only they need a new time
+        df.loc[fix_mask, self.order] = new_order_dates
+        df.loc[fix_mask, self.ship] = new_ship_dates
+        df.loc[fix_mask, self.time_col_name] = new_ship_dates - new_order_dates
 
-        zero_days = pd.Timedelta(days=0)
+        return df
 
-        # Now we pick the lowest which is not negative
-        if no_change_time >= zero_days and no_change_time < best_pick:
-            best_pick = no_change_time
-            fix = DateFixType.NONE
-
-        if swap_time >= zero_days and swap_time < best_pick and best_pick:
-            best_pick = swap_time
-            fix = DateFixType.SWAP
-
-        if order_reformat_time >= zero_days and order_reformat_time < best_pick:
-            best_pick = order_reformat_time
-            fix = DateFixType.ORDER
-
-        if ship_reformat_time >= zero_days and ship_reformat_time < best_pick:
-            best_pick = ship_reformat_time
-            fix = DateFixType.SHIP
-
-        if both_reformat_time >= zero_days and both_reformat_time < best_pick:
-            best_pick = both_reformat_time
-            fix = DateFixType.BOTH
-
-        match fix:
-            case DateFixType.SWAP:
-                row[self.order], row[self.ship] = row[self.ship], row[self.order]
-            case DateFixType.ORDER:
-                row[self.order] = reformated_order_date
-            case DateFixType.SHIP:
-                row[self.ship] = reformated_ship_date
-            case DateFixType.BOTH:
-                row[self.order] = reformated_order_date
-                row[self.ship] = reformated_ship_date
-            case _:
-                print("Unknown state")
-
-        row[self.time_col_name] = row[self.ship] - row[self.order]
-
-        return row
-
-    def _swap_day_month(self, date):
-        """Swaps the day and month, not is the day is over 12 it
-        is not a valid month and calling this will trigger
-        the exception ValueError
+    def _swap_day_month_vec(self, dates: np.ndarray) -> np.ndarray:
+        """Swaps the day and month on a whole array of dates. If the
+        day is over 12 it is not a valid month so the swapped date is
+        set to NaT rather than raising.
 
         Args:
-            date: date to attempt to swap day and month on
+            dates (np.ndarray): datetime64 dates to attempt to swap day
+            and month on
 
         Returns:
-            Row with day and month flipped if possible
+            np.ndarray: datetime64[ns] dates with day and month flipped,
+            NaT where not possible
         """
-        return pd.Timestamp(year=date.year, month=date.day, day=date.month)
+        dates = pd.DatetimeIndex(dates)
+        swapped = pd.to_datetime(
+            dict(year=dates.year, month=dates.day, day=dates.month),
+            errors="coerce",
+        )
+        return swapped.to_numpy(dtype="datetime64[ns]")
 
     def normalise_missing(self, df: pd.DataFrame) -> pd.DataFrame:
-        """This will switch all blank space, nan, nat any data
-        which represents missing data to numpy nan.
+        """This will switch all blank space to numpy nan so it is
+        picked up as missing data along with nan, nat and None.
 
         Args:
             df (pd.DataFrame): Dataframe to normalise missing data on
 
         Returns:
-            pd.DataFrame: normalised dataframe
+            pd.DataFrame: normalised dataframe, columns without any blanks
+            are shared with the original rather than copied
         """
-        df = df.copy()
-        df = df.replace(r"^\s*$", np.nan, regex=True)
-        df = df.where(pd.notna(df), np.nan)
+        # Shallow copy is enough as columns are only ever replaced below
+        df = df.copy(deep=False)
+
+        # Only text columns can hold blank space, numeric ones are left alone
+        text_cols = df.select_dtypes(include=["object", "string", "category"]).columns
+
+        for col in text_cols:
+            series = df[col]
+
+            try:
+                blank_mask = series.str.strip().eq("")
+            except (AttributeError, TypeError):
+                # There are no strings in the column, or only bytes which
+                # .str can't strip, so nothing is blank
+                continue
+
+            if blank_mask.any():
+                df[col] = series.mask(blank_mask, np.nan)
 
         return df
 
-    def summarise_missing(self, df: pd.DataFrame, id_col: str = "Row ID") -> dict:
+    def summarise_missing(
+        self, df: pd.DataFrame, id_col: str = "Row ID", as_list: bool = True
+    ) -> dict:
         """Handy tool to find all the missing data in a dataframe providing a
         list of the rows for each instance of a missing cell in a column.
 
         Args:
             df (pd.DataFrame): _description_
             id_col (str, optional): _description_. Defaults to "Row ID".
+            as_list (bool, optional): Return the Row IDs as python lists,
+            if False they are left as numpy arrays which is much cheaper on
+            large frames. Defaults to True.
 
         Raises:
             KeyError: If the identifier col is not in the dataframe
 
         Returns:
             dict: A dictionary with the key being the missing column name
-            with points to a list of the Row ID which identifies them
+            with points to a list of the Row ID which identifies them, or a
+            numpy array of them when as_list is False
         """
 
         if id_col not in df.columns:
@@ -197,24 +191,36 @@ class DataCleaner:
         # Convert blank or whitespace into NaN
         df_clean = self.normalise_missing(df)
 
-        result = {}
+        # Don't process the ID column itself
+        check_cols = df_clean.columns.drop(id_col)
 
-        for col in df_clean.columns:
-            if col == id_col:
-                continue  # Don't process the ID column itself
+        # Boolean mask of missing values for every column in one pass,
+        # transposed so the positions come out column by column
+        missing_mask = df_clean[check_cols].isna().to_numpy()
+        col_pos, row_pos = np.nonzero(missing_mask.T)
 
-            # Boolean mask of missing values
-            missing_mask = df_clean[col].isna()
+        # Split the row IDs wherever the column changes
+        missing_cols, col_starts = np.unique(col_pos, return_index=True)
 
-            if missing_mask.any():
-                # Extract row IDs for missing rows
-                missing_ids = df_clean.loc[missing_mask, id_col].tolist()
-                result[col] = missing_ids
+        if as_list:
+            # Series.tolist keeps IDs as pandas scalars, such as Timestamp
+            missing_ids = df_clean[id_col].iloc[row_pos].tolist()
+            col_ends = np.append(col_starts[1:], len(row_pos))
+            col_ids = [
+                missing_ids[start:end] for start, end in zip(col_starts, col_ends)
+            ]
+        else:
+            missing_ids = df_clean[id_col].to_numpy()[row_pos]
+            col_ids = np.split(missing_ids, col_starts[1:])
 
-        return result
+        return dict(zip(check_cols[missing_cols], col_ids))
 
     def check_order_consistency(
-        self, df: pd.DataFrame, key_col: str, check_cols: list[str]
+        self,
+        df: pd.DataFrame,
+        key_col: str,
+        check_cols: list[str],
+        verbose: bool = True,
     ) -> set:
         """Rows which are in the same order, much of the data can be
         repeated, this allows us to fill missing data from other rows in the
@@ -229,32 +235,70 @@ class DataCleaner:
             df (pd.DataFrame): complete data frame
             key_col (str): col which links all rows in an order together
             check_cols (list[str]): columns which should be same in all rows
+            verbose (bool, optional): print the inconsistent orders and their
+            rows, turn off when only the returned set is needed as printing
+            large orders is slow. Defaults to True.
 
         Returns:
             set: Set of orders which are inconsistent
         """
-        # Count distinct values per order per column
-        counts = df.groupby(key_col, dropna=False)[check_cols].nunique(dropna=True)
+        # Integer codes for the orders, missing keys get a code of their own
+        order_codes, order_ids = pd.factorize(df[key_col], use_na_sentinel=False)
+
+        # An order is inconsistent in a column when the largest and smallest
+        # codes of its values differ. Missing values are -1, so they are
+        # swapped for the largest int when taking the smallest to ignore them
+        max_codes = {}
+        min_codes = {}
+        for col in check_cols:
+            col_codes = pd.factorize(df[col])[0]
+            max_codes[col] = col_codes
+            min_codes[col] = np.where(
+                col_codes < 0, np.iinfo(col_codes.dtype).max, col_codes
+            )
+
+        # Index set explicitly so there is still a row per order with no columns
+        row_index = pd.RangeIndex(len(df))
+        max_per_order = (
+            pd.DataFrame(max_codes, index=row_index).groupby(order_codes).max()
+        )
+        min_per_order = (
+            pd.DataFrame(min_codes, index=row_index).groupby(order_codes).min()
+        )
 
-        # Identify inconsistent orders (any column > 1 unique value)
-        inconsistent_mask = ~counts.le(1).all(axis=1)
-        inconsistent_orders = counts.index[inconsistent_mask]
+        # Which columns differ for each order, rows are in order code order
+        differs = max_per_order.to_numpy() > min_per_order.to_numpy()
+        inconsistent_pos = np.flatnonzero(differs.any(axis=1))
+        inconsistent_orders = order_ids[inconsistent_pos]
 
         if inconsistent_orders.empty:
-            print("All orders are consistent across the specified columns.")
+            if verbose:
+                print("All orders are consistent across the specified columns.")
             return True
 
+        if not verbose:
+            return set(inconsistent_orders)
+
+        # Report the orders sorted by their id
+        inconsistent_orders, sorter = inconsistent_orders.sort_values(
+            return_indexer=True
+        )
+        inconsistent_pos = inconsistent_pos[sorter]
+
         print(f"Found {len(inconsistent_orders)} inconsistent orders:\n")
 
+        # Row positions for every order code, so each one isn't a full scan
+        order_rows = pd.Series(np.arange(len(df))).groupby(order_codes).indices
+
         inconsistent_set = set()
-        for order_id in inconsistent_orders:
+        for pos, order_id in zip(inconsistent_pos, inconsistent_orders):
             inconsistent_set.add(order_id)
             # Columns that differ
-            bad_cols = counts.columns[counts.loc[order_id] > 1].tolist()
+            bad_cols = [col for col, bad in zip(check_cols, differs[pos]) if bad]
             print(f"Order {order_id} — inconsistent in: {', '.join(bad_cols)}\n")
 
             # Print full rows for this order
-            display_df = df[df[key_col] == order_id]
+            display_df = df.iloc[order_rows[pos]]
             print(display_df.to_string(index=False))
             print("-" * 80)
 
@@ -286,8 +330,12 @@ class DataCleaner:
             pd.DataFrame: Returns the updated dataframe
         """
 
-        blank_mask = df[blank_col_name].isna()
-        rel_present_mask = df[relative_col_names].notna().all(axis=1)
+        blank_mask = df[blank_col_name].isna().to_numpy()
+
+        # And each relative column into one mask rather than building a frame
+        rel_present_mask = np.ones(len(df), dtype=bool)
+        for col in relative_col_names:
+            rel_present_mask &= df[col].notna().to_numpy()
 
         to_fill_mask = blank_mask & rel_present_mask
         if not to_fill_mask.any():
@@ -300,19 +348,24 @@ class DataCleaner:
         if lookup_df.empty:
             return df
 
-        to_fill_df = df.loc[to_fill_mask, relative_col_names + [blank_col_name]]
-
-        merged = to_fill_df.merge(
-            lookup_df,
-            on=relative_col_names,
-            how="left",
-            suffixes=("", "_source"),
-        )
-
-        filled_values = merged[blank_col_name].fillna(
-            merged[blank_col_name + "_source"]
+        # Position of each blank row's relative values in the lookup,
+        # -1 where there is no known value, then take the values from there
+        if len(relative_col_names) == 1:
+            # A plain index is much quicker to search than a one level MultiIndex
+            rel_col = relative_col_names[0]
+            lookup_keys = pd.Index(lookup_df[rel_col])
+            to_fill_keys = df.loc[to_fill_mask, rel_col]
+        else:
+            lookup_keys = pd.MultiIndex.from_frame(lookup_df[relative_col_names])
+            to_fill_keys = pd.MultiIndex.from_frame(
+                df.loc[to_fill_mask, relative_col_names]
+            )
+        lookup_pos = lookup_keys.get_indexer(to_fill_keys)
+
+        filled_values = pd.api.extensions.take(
+            lookup_df[blank_col_name].to_numpy(), lookup_pos, allow_fill=True
         )
 
-        df.loc[to_fill_mask, blank_col_name] = filled_values.to_numpy()
+        df.loc[to_fill_mask, blank_col_name] = filled_values
 
         return df
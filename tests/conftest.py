@@ -0,0 +1,12 @@
+import pytest
+import pandas as pd
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _warm_pandas():
+    """Runs the first datetime, groupby and category operations up front
+    so their one off setup isn't charged to whichever test runs first.
+    """
+    pd.to_datetime(["2020-01-01"], format="%Y-%m-%d")
+    pd.DataFrame({"a": [1]}).groupby("a").sum()
+    pd.Series(["x"], dtype="category")
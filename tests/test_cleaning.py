@@ -1,76 +1,118 @@
+import re
+import pytest
 import pandas as pd
 import numpy as np
 from data_workbench.cleaning import DataCleaner
 
+# Missing value sentinels used in the frame literals below
+NAN = np.nan
+NAT = pd.NaT
 
-def test_swap_dates_are_fixed():
-    df = pd.DataFrame({"Order Date": ["20/01/2020"], "Ship Date": ["19/01/2020"]})
 
-    df["Order Date"] = pd.to_datetime(df["Order Date"], dayfirst=True)
-    df["Ship Date"] = pd.to_datetime(df["Ship Date"], dayfirst=True)
+@pytest.fixture(scope="module")
+def cleaner():
+    return DataCleaner()
 
-    cleaner = DataCleaner()
-    out = cleaner.fix_order_ship_dates(df)
-
-    assert out.iloc[0]["Time Till Shipping"] == pd.Timedelta(days=1)
-
-
-def test_reformat_order_date_fixed():
-
-    df = pd.DataFrame({"Order Date": ["01/11/2020"], "Ship Date": ["12/01/2020"]})
-
-    df["Order Date"] = pd.to_datetime(df["Order Date"], dayfirst=True)
-    df["Ship Date"] = pd.to_datetime(df["Ship Date"], dayfirst=True)
 
-    cleaner = DataCleaner()
-    out = cleaner.fix_order_ship_dates(df)
+def _dmy(date):
+    day, month, year = date.split("/")
+    return np.datetime64(f"{year}-{month}-{day}", "ns")
 
-    assert out.iloc[0]["Time Till Shipping"] == pd.Timedelta(days=1)
 
-    pass
+@pytest.fixture
+def mk_dates():
+    def _mk_dates(order_date, ship_date):
+        return pd.DataFrame(
+            {
+                "Order Date": np.array([_dmy(order_date)], dtype="datetime64[ns]"),
+                "Ship Date": np.array([_dmy(ship_date)], dtype="datetime64[ns]"),
+            }
+        )
 
+    return _mk_dates
 
-def test_reformat_ship_date_fixed():
-    df = pd.DataFrame({"Order Date": ["01/01/2020"], "Ship Date": ["01/02/2020"]})
 
-    df["Order Date"] = pd.to_datetime(df["Order Date"], dayfirst=True)
-    df["Ship Date"] = pd.to_datetime(df["Ship Date"], dayfirst=True)
+@pytest.mark.parametrize(
+    "order_date,ship_date,expected_days",
+    [
+        pytest.param("20/01/2020", "19/01/2020", 1, id="swap_dates"),
+        pytest.param("01/11/2020", "12/01/2020", 1, id="reformat_order_date"),
+        pytest.param("01/01/2020", "01/02/2020", 1, id="reformat_ship_date"),
+        pytest.param("12/01/2020", "12/04/2020", 3, id="reformat_both_dates"),
+        pytest.param("01/01/2020", "15/01/2020", 14, id="no_change_required"),
+    ],
+)
+def test_order_ship_dates_fixed(
+    cleaner, mk_dates, order_date, ship_date, expected_days
+):
+    df = mk_dates(order_date, ship_date)
 
-    cleaner = DataCleaner()
     out = cleaner.fix_order_ship_dates(df)
 
-    assert out.iloc[0]["Time Till Shipping"] == pd.Timedelta(days=1)
-
+    assert out.iloc[0]["Time Till Shipping"] == pd.Timedelta(days=expected_days)
 
-def test_reformat_dates_fixed():
-    df = pd.DataFrame({"Order Date": ["12/01/2020"], "Ship Date": ["12/04/2020"]})
 
-    df["Order Date"] = pd.to_datetime(df["Order Date"], dayfirst=True)
-    df["Ship Date"] = pd.to_datetime(df["Ship Date"], dayfirst=True)
+def _dates(dmy_dates):
+    return np.array(
+        [np.datetime64("NaT") if date is None else _dmy(date) for date in dmy_dates],
+        "datetime64[ns]",
+    )
 
-    cleaner = DataCleaner()
-    out = cleaner.fix_order_ship_dates(df)
 
-    assert out.iloc[0]["Time Till Shipping"] == pd.Timedelta(days=3)
+def test_order_ship_dates_fixed_only_on_flagged_rows(cleaner):
+    df = pd.DataFrame(
+        {
+            "Order Date": _dates(
+                ["20/01/2020", "01/01/2020", None, "01/11/2020", "12/01/2020"]
+            ),
+            "Ship Date": _dates(
+                ["19/01/2020", "15/01/2020", "05/03/2020", "12/01/2020", "12/04/2020"]
+            ),
+        },
+        index=[10, 20, 30, 40, 50],
+    )
 
-    pass
+    out = cleaner.fix_order_ship_dates(df)
 
+    expected = pd.DataFrame(
+        {
+            "Order Date": _dates(
+                ["19/01/2020", "01/01/2020", None, "11/01/2020", "01/12/2020"]
+            ),
+            "Ship Date": _dates(
+                ["20/01/2020", "15/01/2020", "05/03/2020", "12/01/2020", "04/12/2020"]
+            ),
+            "Time Till Shipping": pd.to_timedelta(
+                [1, 14, None, 1, 3], unit="D"
+            ).as_unit("ns"),
+        },
+        index=[10, 20, 30, 40, 50],
+    )
+    pd.testing.assert_frame_equal(out, expected)
 
-def test_no_date_change_required():
-    df = pd.DataFrame({"Order Date": ["01/01/2020"], "Ship Date": ["15/01/2020"]})
 
-    df["Order Date"] = pd.to_datetime(df["Order Date"], dayfirst=True)
-    df["Ship Date"] = pd.to_datetime(df["Ship Date"], dayfirst=True)
+def test_order_ship_dates_unchanged_when_nothing_to_fix(cleaner):
+    df = pd.DataFrame(
+        {
+            "Order Date": _dates(["01/01/2020", None, "03/02/2020"]),
+            "Ship Date": _dates(["15/01/2020", "05/03/2020", "03/02/2020"]),
+        },
+        index=["a", "b", "c"],
+    )
+    original = df.copy()
 
-    cleaner = DataCleaner()
     out = cleaner.fix_order_ship_dates(df)
 
-    assert out.iloc[0]["Time Till Shipping"] == pd.Timedelta(days=14)
-
-    pass
+    pd.testing.assert_frame_equal(out[["Order Date", "Ship Date"]], original)
+    assert out["Time Till Shipping"].tolist()[::2] == [
+        pd.Timedelta(days=14),
+        pd.Timedelta(0),
+    ]
+    assert pd.isna(out["Time Till Shipping"].iloc[1])
 
 
-def test_dataframe_summary():
+@pytest.fixture(scope="module")
+def summary_df():
     df = pd.DataFrame(
         {
             "Order ID": [
@@ -80,11 +122,11 @@ def test_dataframe_summary():
                 "",
                 None,
             ],
-            "Quantity": [5, 2, None, 7, np.nan],
-            "Price": [19.99, np.nan, 15.49, 42.00, 7.95],
+            "Quantity": [5, 2, None, 7, NAN],
+            "Price": [19.99, NAN, 15.49, 42.00, 7.95],
             "Order Date": [
                 "18/11/2017",
-                pd.NaT,
+                NAT,
                 "20/11/2017",
                 "",
                 "   ",
@@ -93,7 +135,7 @@ def test_dataframe_summary():
                 "20/11/2017",
                 "22/11/2017",
                 None,
-                pd.NaT,
+                NAT,
                 "25/11/2017",
             ],
             "Customer Name": [
@@ -112,6 +154,10 @@ def test_dataframe_summary():
     )
     df.insert(0, "Row ID", df.index + 1)
 
+    return df
+
+
+def test_dataframe_summary(cleaner, summary_df):
     expected = {
         "Order ID": [4, 5],
         "Quantity": [3, 5],
@@ -122,5 +168,254 @@ def test_dataframe_summary():
         "Comments": [1, 3, 4],
         "Category": [2, 4],
     }
-    cleaner = DataCleaner()
-    assert expected == cleaner.summarise_missing(df)
+    assert expected == cleaner.summarise_missing(summary_df)
+
+
+def _address_df():
+    return pd.DataFrame(
+        {
+            "Postal Code": [10001, 10001, 90210, 90210, 60601, NAN],
+            "State": [
+                "New York",
+                "New York",
+                "California",
+                "California",
+                "Illinois",
+                "Illinois",
+            ],
+            "City": [
+                "New York City",
+                NAN,
+                NAN,
+                "Beverly Hills",
+                NAN,
+                NAN,
+            ],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "blank_col,rel_cols,expected",
+    [
+        pytest.param(
+            "City",
+            ["Postal Code"],
+            [
+                "New York City",
+                "New York City",
+                "Beverly Hills",
+                "Beverly Hills",
+                NAN,
+                NAN,
+            ],
+            id="single_relative_column",
+        ),
+        pytest.param(
+            "City",
+            ["Postal Code", "State"],
+            [
+                "New York City",
+                "New York City",
+                "Beverly Hills",
+                "Beverly Hills",
+                NAN,
+                NAN,
+            ],
+            id="multiple_relative_columns",
+        ),
+        pytest.param(
+            "Postal Code",
+            ["State"],
+            [10001, 10001, 90210, 90210, 60601, 60601],
+            id="fill_numeric_column",
+        ),
+    ],
+)
+def test_fill_blank_relative(cleaner, blank_col, rel_cols, expected):
+    # Built fresh for each case as the blanks are filled in place
+    out = cleaner.fill_blank_relative(_address_df(), blank_col, rel_cols)
+
+    pd.testing.assert_series_equal(
+        out[blank_col], pd.Series(expected, name=blank_col), check_dtype=False
+    )
+
+
+def test_fill_blank_relative_no_blanks_no_change(cleaner):
+    df = pd.DataFrame(
+        {"Postal Code": [10001, 90210], "City": ["New York City", "Beverly Hills"]}
+    )
+    original = df.copy()
+
+    out = cleaner.fill_blank_relative(df, "City", ["Postal Code"])
+
+    assert out is df
+    assert df.equals(original)
+
+
+def test_dataframe_summary_as_arrays(cleaner):
+    df = pd.DataFrame(
+        {
+            "Row ID": [1, 2, 3],
+            "Customer Name": ["John Smith", "  ", None],
+            "Price": [19.99, 15.49, 7.95],
+        }
+    )
+
+    out = cleaner.summarise_missing(df, as_list=False)
+
+    assert list(out) == ["Customer Name"]
+    np.testing.assert_array_equal(out["Customer Name"], np.array([2, 3]))
+
+
+CONSISTENT_ORDERS_DF = pd.DataFrame(
+    {
+        "Order ID": ["A", "A", "B"],
+        "Customer": ["John Smith", "John Smith", "Jane Doe"],
+        "City": ["Leeds", "Leeds", "York"],
+    }
+)
+
+INCONSISTENT_COLUMNS_DF = pd.DataFrame(
+    {
+        "Order ID": ["A", "A", "B", "B"],
+        "Customer": ["John Smith", "Jane Doe", "Alice Jones", "Alice Jones"],
+        "City": ["Leeds", "York", "Hull", NAN],
+    }
+)
+
+INCONSISTENT_ORDERS_DF = pd.DataFrame(
+    {
+        "Order ID": ["A", "A", "B", "B"],
+        "Customer": ["John Smith", "Jane Doe", "Alice Jones", "Bob Martin"],
+        "City": ["Leeds", "Leeds", "Hull", "Hull"],
+    }
+)
+
+# Lines reporting which columns an inconsistent order differs in
+_INCONSISTENT_LINE_RE = re.compile(r"^Order (\S+) — inconsistent in: (.+)$", re.M)
+
+CONSISTENCY_CASES = [
+    pytest.param(CONSISTENT_ORDERS_DF, True, True, {}, id="all_consistent"),
+    pytest.param(
+        INCONSISTENT_COLUMNS_DF,
+        True,
+        {"A"},
+        {"A": ["Customer", "City"]},
+        id="multiple_inconsistent_columns",
+    ),
+    pytest.param(
+        INCONSISTENT_ORDERS_DF,
+        True,
+        {"A", "B"},
+        {"A": ["Customer"], "B": ["Customer"]},
+        id="multiple_inconsistent_orders",
+    ),
+    pytest.param(INCONSISTENT_ORDERS_DF, False, {"A", "B"}, {}, id="not_verbose"),
+]
+
+
+@pytest.mark.parametrize("df,verbose,expected,expected_report", CONSISTENCY_CASES)
+def test_check_order_consistency(
+    cleaner, df, verbose, expected, expected_report, capsys
+):
+    out = cleaner.check_order_consistency(
+        df, "Order ID", ["Customer", "City"], verbose=verbose
+    )
+
+    assert out == expected
+
+    captured = capsys.readouterr().out
+    assert bool(captured) == verbose
+    assert ("All orders are consistent" in captured) == (verbose and out is True)
+
+    reported = {
+        order_id: cols.split(", ")
+        for order_id, cols in _INCONSISTENT_LINE_RE.findall(captured)
+    }
+    assert reported == expected_report
+
+
+@pytest.mark.parametrize(
+    "order_ids",
+    [
+        pytest.param([1.0, 1.0, NAN, NAN], id="float_key"),
+        pytest.param(
+            np.array(["2020-01-01", "2020-01-01", "NaT", "NaT"], "datetime64[ns]"),
+            id="datetime_key",
+        ),
+    ],
+)
+def test_check_order_consistency_missing_key(cleaner, order_ids, capsys):
+    df = pd.DataFrame(
+        {
+            "Order ID": order_ids,
+            "Customer": ["John Smith", "Jane Doe", "Alice Jones", "Bob Martin"],
+        }
+    )
+
+    out = cleaner.check_order_consistency(df, "Order ID", ["Customer"])
+
+    assert len(out) == 2
+    assert sum(pd.isna(order_id) for order_id in out) == 1
+    captured = capsys.readouterr().out
+    assert "Alice Jones" in captured and "Bob Martin" in captured
+
+
+def test_dataframe_summary_keeps_timestamp_ids(cleaner):
+    df = pd.DataFrame(
+        {
+            "Row ID": np.array(["2020-01-01", "2020-01-02"], "datetime64[ns]"),
+            "Customer Name": ["John Smith", NAN],
+        }
+    )
+
+    out = cleaner.summarise_missing(df)
+
+    assert out == {"Customer Name": [pd.Timestamp("2020-01-02")]}
+    assert isinstance(out["Customer Name"][0], pd.Timestamp)
+
+
+def test_dataframe_summary_ignores_bytes_column(cleaner):
+    df = pd.DataFrame({"Row ID": [1, 2], "Raw": pd.Series([b"a", b" "], dtype=object)})
+
+    assert cleaner.summarise_missing(df) == {}
+
+
+def test_normalise_missing_shares_columns_without_blanks(cleaner):
+    df = pd.DataFrame(
+        {
+            "Customer Name": pd.Series(["John Smith", "Jane Doe"], dtype=object),
+            "Comments": pd.Series(["Ok", "  "], dtype=object),
+        }
+    )
+
+    out = cleaner.normalise_missing(df)
+
+    assert out["Customer Name"].dtype == object
+    assert np.shares_memory(
+        out["Customer Name"].to_numpy(), df["Customer Name"].to_numpy()
+    )
+    assert pd.isna(out["Comments"].iloc[1])
+
+
+def test_check_order_consistency_no_check_columns(cleaner, capsys):
+    out = cleaner.check_order_consistency(CONSISTENT_ORDERS_DF, "Order ID", [])
+
+    assert out is True
+    assert "All orders are consistent" in capsys.readouterr().out
+
+
+def test_order_ship_dates_fixed_on_object_columns(cleaner):
+    df = pd.DataFrame(
+        {
+            "Order Date": pd.Series([pd.Timestamp("2020-01-20")], dtype=object),
+            "Ship Date": pd.Series([pd.Timestamp("2020-01-19")], dtype=object),
+        }
+    )
+
+    out = cleaner.fix_order_ship_dates(df)
+
+    assert out.iloc[0]["Order Date"] == pd.Timestamp("2020-01-19")
+    assert out.iloc[0]["Ship Date"] == pd.Timestamp("2020-01-20")
+    assert out.iloc[0]["Time Till Shipping"] == pd.Timedelta(days=1)